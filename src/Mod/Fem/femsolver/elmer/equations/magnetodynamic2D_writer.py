@@ -28,13 +28,31 @@ __url__ = "https://www.freecad.org"
 ## \addtogroup FEM
 #  @{
 
-from FreeCAD import Console
 from FreeCAD import Units
 
 from .. import sifio
 from .. import writer as general_writer
 
 
+_FA_MGDYN2D = sifio.FileAttr("MagnetoDynamics2D/MagnetoDynamics2D")
+_FA_MGDYN2D_HARM = sifio.FileAttr("MagnetoDynamics2D/MagnetoDynamics2DHarmonic")
+_FA_CALCFIELDS = sifio.FileAttr("MagnetoDynamics/MagnetoDynamicsCalcFields")
+
+# (equation property, solver keyword, Elmer default of the keyword)
+_POST_FLAGS = (
+    ("CalculateCurrentDensity", "Calculate Current Density", False),
+    ("CalculateElectricField", "Calculate Electric Field", False),
+    ("CalculateElementalFields", "Calculate Elemental Fields", True),
+    ("CalculateHarmonicLoss", "Calculate Harmonic Loss", False),
+    ("CalculateJouleHeating", "Calculate Joule Heating", False),
+    ("CalculateMagneticFieldStrength", "Calculate Magnetic Field Strength", False),
+    ("CalculateMaxwellStress", "Calculate Maxwell Stress", False),
+    ("CalculateNodalFields", "Calculate Nodal Fields", True),
+    ("CalculateNodalForces", "Calculate Nodal Forces", False),
+    ("CalculateNodalHeating", "Calculate Nodal Heating", False),
+)
+
+
 class MgDyn2Dwriter:
 
     def __init__(self, writer, solver):
@@ -46,11 +64,11 @@ class MgDyn2Dwriter:
         s = self.write.createNonlinearSolver(equation)
         if not equation.IsHarmonic:
             s["Equation"] = "MgDyn2D"
-            s["Procedure"] = sifio.FileAttr("MagnetoDynamics2D/MagnetoDynamics2D")
+            s["Procedure"] = _FA_MGDYN2D
             s["Variable"] = "Potential"
         else:
             s["Equation"] = "MgDyn2DHarmonic"
-            s["Procedure"] = sifio.FileAttr("MagnetoDynamics2D/MagnetoDynamics2DHarmonic")
+            s["Procedure"] = _FA_MGDYN2D_HARM
             s["Variable"] = "Potential[Potential Re:1 Potential Im:1]"
         s["Exec Solver"] = "Always"
         s["Optimize Bandwidth"] = True
@@ -62,30 +80,14 @@ class MgDyn2Dwriter:
         s = self.write.createNonlinearSolver(equation)
         s["Equation"] = "MgDyn2DPost"
         s["Exec Solver"] = "Always"
-        s["Procedure"] = sifio.FileAttr("MagnetoDynamics/MagnetoDynamicsCalcFields")
+        s["Procedure"] = _FA_CALCFIELDS
         if equation.IsHarmonic:
             s["Angular Frequency"] = float(Units.Quantity(equation.AngularFrequency).Value)
         s["Potential Variable"] = "Potential"
-        if equation.CalculateCurrentDensity is True:
-            s["Calculate Current Density"] = True
-        if equation.CalculateElectricField is True:
-            s["Calculate Electric Field"] = True
-        if equation.CalculateElementalFields is False:
-            s["Calculate Elemental Fields"] = False
-        if equation.CalculateHarmonicLoss is True:
-            s["Calculate Harmonic Loss"] = True
-        if equation.CalculateJouleHeating is True:
-            s["Calculate Joule Heating"] = True
-        if equation.CalculateMagneticFieldStrength is True:
-            s["Calculate Magnetic Field Strength"] = True
-        if equation.CalculateMaxwellStress is True:
-            s["Calculate Maxwell Stress"] = True
-        if equation.CalculateNodalFields is False:
-            s["Calculate Nodal Fields"] = False
-        if equation.CalculateNodalForces is True:
-            s["Calculate Nodal Forces"] = True
-        if equation.CalculateNodalHeating is True:
-            s["Calculate Nodal Heating"] = True
+        for attr, key, default in _POST_FLAGS:
+            # only output flags that differ from the Elmer default
+            if bool(getattr(equation, attr)) != default:
+                s[key] = not default
         s["Optimize Bandwidth"] = True
         s["Stabilize"] = equation.Stabilize
         return s
@@ -105,32 +107,43 @@ class MgDyn2Dwriter:
         self.write.constant("Permittivity Of Vacuum", round(permittivity, 20))
 
     def handleMagnetodynamic2DMaterial(self, bodies):
-        # check that all bodies have a set material
+        # collect each material's bodies once; as in getBodyMaterial(),
+        # only referenced materials count for the presence check
+        materialRefs = []
+        referenced = set()
+        allBodies = None
+        for obj in self.write.getMember("App::MaterialObject"):
+            if obj.References:
+                refs = obj.References[0][1]
+                referenced.update(refs)
+            else:
+                if allBodies is None:
+                    allBodies = self.write.getAllBodies()
+                refs = allBodies
+            materialRefs.append((obj, refs))
         for name in bodies:
-            if self.write.getBodyMaterial(name) is None:
+            if name not in referenced:
                 raise general_writer.WriteError(
-                    "The body {} is not referenced in any material.\n\n".format(name)
+                    f"The body {name} is not referenced in any material.\n\n"
                 )
-        for obj in self.write.getMember("App::MaterialObject"):
+        bodySet = set(bodies)
+        for obj, refs in materialRefs:
             m = obj.Material
-            refs = (
-                obj.References[0][1]
-                if obj.References
-                else self.write.getAllBodies())
-            for name in (n for n in refs if n in bodies):
-                if "ElectricalConductivity" not in m:
-                    Console.PrintMessage("m: {}\n".format(m))
-                    raise general_writer.WriteError(
-                        "The electrical conductivity must be specified for all materials.\n\n"
-                    )
-                if "RelativePermeability" not in m:
-                    Console.PrintMessage("m: {}\n".format(m))
-                    raise general_writer.WriteError(
-                        "The relative permeability must be specified for all materials.\n\n"
-                    )
+            names = [n for n in refs if n in bodySet]
+            if not names:
+                continue
+            if "ElectricalConductivity" not in m:
+                raise general_writer.WriteError(
+                    "The electrical conductivity must be specified for all materials.\n\n"
+                )
+            if "RelativePermeability" not in m:
+                raise general_writer.WriteError(
+                    "The relative permeability must be specified for all materials.\n\n"
+                )
+            conductivity = self.write.convert(m["ElectricalConductivity"], "T^3*I^2/(L^3*M)")
+            conductivity = round(conductivity, 10)  # to get rid of numerical artifacts
+            for name in names:
                 self.write.material(name, "Name", m["Name"])
-                conductivity = self.write.convert(m["ElectricalConductivity"], "T^3*I^2/(L^3*M)")
-                conductivity = round(conductivity, 10)  # to get rid of numerical artifacts
                 self.write.material(name, "Electric Conductivity", conductivity)
                 self.write.material(
                     name, "Relative Permeability",
@@ -143,98 +156,115 @@ class MgDyn2Dwriter:
                         float(m["RelativePermittivity"])
                     )
 
-    def _outputMagnetodynamic2DBodyForce(self, obj, name, equation):
+    def _getMagnetodynamic2DCurrentDensity(self, obj, equation):
+        # the values only depend on the constraint, not on the body
+        currentDensities = []
         if hasattr(obj, "CurrentDensity_re_1"):
             # output only if current density is enabled and needed
             if not obj.CurrentDensity_re_1_Disabled:
                 currentDensity = float(obj.CurrentDensity_re_1.getValueAs("A/m^2"))
-                self.write.bodyForce(name, "Current Density", round(currentDensity, 6))
+                currentDensities.append(("Current Density", round(currentDensity, 6)))
             # imaginaries are only needed for harmonic equation
             if equation.IsHarmonic:
                 if not obj.CurrentDensity_im_1_Disabled:
                     currentDensity = float(obj.CurrentDensity_im_1.getValueAs("A/m^2"))
-                    self.write.bodyForce(name, "Current Density Im", round(currentDensity, 6))
+                    currentDensities.append(("Current Density Im", round(currentDensity, 6)))
+        return currentDensities
 
+    def _getMagnetodynamic2DMagnetization(self, obj, equation):
+        # the values only depend on the constraint, not on the body
+        magnetizations = []
         if hasattr(obj, "Magnetization_re_1"):
             # output only if magnetization is enabled and needed
             if not obj.Magnetization_re_1_Disabled:
                 magnetization = float(obj.Magnetization_re_1.getValueAs("A/m"))
-                self.write.material(name, "Magnetization 1", round(magnetization, 6))
+                magnetizations.append(("Magnetization 1", round(magnetization, 6)))
             if not obj.Magnetization_re_2_Disabled:
                 magnetization = float(obj.Magnetization_re_2.getValueAs("A/m"))
-                self.write.material(name, "Magnetization 2", round(magnetization, 6))
+                magnetizations.append(("Magnetization 2", round(magnetization, 6)))
             # imaginaries are only needed for harmonic equation
             if equation.IsHarmonic:
                 if not obj.Magnetization_im_1_Disabled:
                     magnetization = float(obj.Magnetization_im_1.getValueAs("A/m"))
-                    self.write.material(name, "Magnetization Im 1", round(magnetization, 6))
+                    magnetizations.append(("Magnetization Im 1", round(magnetization, 6)))
                 if not obj.Magnetization_im_2_Disabled:
                     magnetization = float(obj.Magnetization_im_2.getValueAs("A/m"))
-                    self.write.material(name, "Magnetization Im 2", round(magnetization, 6))
+                    magnetizations.append(("Magnetization Im 2", round(magnetization, 6)))
+        return magnetizations
 
     def handleMagnetodynamic2DBodyForces(self, bodies, equation):
         currentDensities = self.write.getMember("Fem::ConstraintCurrentDensity")
         for obj in currentDensities:
             if obj.References:
-                for name in obj.References[0][1]:
-                    self._outputMagnetodynamic2DBodyForce(obj, name, equation)
-                self.write.handled(obj)
+                names = obj.References[0][1]
             else:
                 # if there is only one current density without a reference,
                 # add it to all bodies
                 if len(currentDensities) == 1:
-                    for name in bodies:
-                        self._outputMagnetodynamic2DBodyForce(obj, name, equation)
+                    names = bodies
                 else:
                     raise general_writer.WriteError(
                         "Several current density constraints found without reference to a body.\n"
                         "Please set a body for each current density constraint."
                     )
+            values = self._getMagnetodynamic2DCurrentDensity(obj, equation)
+            for name in names:
+                for key, value in values:
+                    self.write.bodyForce(name, key, value)
             self.write.handled(obj)
 
         magnetizations = self.write.getMember("Fem::ConstraintMagnetization")
         for obj in magnetizations:
             if obj.References:
-                for name in obj.References[0][1]:
-                    self._outputMagnetodynamic2DBodyForce(obj, name, equation)
-                self.write.handled(obj)
+                names = obj.References[0][1]
             else:
                 # if there is only one magnetization without a reference,
                 # add it to all bodies
                 if len(magnetizations) == 1:
-                    for name in bodies:
-                        self._outputMagnetodynamic2DBodyForce(obj, name, equation)
+                    names = bodies
                 else:
                     raise general_writer.WriteError(
                         "Several magnetization constraints found without reference to a body.\n"
                         "Please set a body for each current density constraint."
                     )
+            values = self._getMagnetodynamic2DMagnetization(obj, equation)
+            for name in names:
+                for key, value in values:
+                    self.write.material(name, key, value)
             self.write.handled(obj)
 
     def handleMagnetodynamic2DBndConditions(self):
         for obj in self.write.getMember("Fem::ConstraintElectrostaticPotential"):
             if obj.References:
+                # the properties do not depend on the boundary, read them once
+                label = obj.Label
+                potentialQuantity = getattr(obj, "Potential", None)
+                potential = None
+                if obj.PotentialEnabled and potentialQuantity is not None:
+                    potential = round(float(potentialQuantity.getValueAs("V")), 6)
+                electricInfinity = obj.ElectricInfinity
                 for name in obj.References[0][1]:
                     # output the FreeCAD label as comment
-                    if obj.Label:
-                        self.write.boundary(name, "! FreeCAD Name", obj.Label)
-                    if obj.PotentialEnabled:
-                        if hasattr(obj, "Potential"):
-                            potential = float(obj.Potential.getValueAs("V"))
-                            self.write.boundary(name, "Potential", round(potential, 6))
-                    if obj.ElectricInfinity:
+                    if label:
+                        self.write.boundary(name, "! FreeCAD Name", label)
+                    if potential is not None:
+                        self.write.boundary(name, "Potential", potential)
+                    if electricInfinity:
                         self.write.boundary(name, "Infinity BC", True)
                 self.write.handled(obj)
 
     def handleMagnetodynamic2DEquation(self, bodies, equation):
+        if equation.IsHarmonic and (equation.AngularFrequency == 0):
+            raise general_writer.WriteError(
+                "The angular frequency must not be zero.\n\n"
+            )
+        name = equation.Name
+        if equation.IsHarmonic:
+            frequency = float(Units.Quantity(equation.AngularFrequency).Value)
+            frequency = round(frequency, 6)
         for b in bodies:
-            if equation.IsHarmonic and (equation.AngularFrequency == 0):
-                raise general_writer.WriteError(
-                    "The angular frequency must not be zero.\n\n"
-                )
-            self.write.equation(b, "Name", equation.Name)
+            self.write.equation(b, "Name", name)
             if equation.IsHarmonic:
-                frequency = float(Units.Quantity(equation.AngularFrequency).Value)
-                self.write.equation(b, "Angular Frequency", round(frequency, 6))
+                self.write.equation(b, "Angular Frequency", frequency)
 
 ##  @}
@@ -200,6 +200,16 @@ class TestSolverElmer(unittest.TestCase):
         setup(self.document, "elmer")
         self.input_file_writing_test(get_namefromdef("test_"))
 
+    # ********************************************************************************************
+    def test_equation_magnetostatics_2D_0_mm(
+        self
+    ):
+        fcc_print("")
+        self.set_unit_schema(0)  # mm/kg/s
+        from femexamples.equation_magnetostatics_2D_elmer import setup
+        setup(self.document, "elmer")
+        self.input_file_writing_test(get_namefromdef("test_"))
+
     # ********************************************************************************************
     def input_file_writing_test(
         self,